@@ -1,7 +1,7 @@
 """Streamlit front-end for the Video Clipper application."""
 from __future__ import annotations
 
-import shutil
+import os
 import uuid
 from contextlib import contextmanager
 from pathlib import Path
@@ -149,14 +149,34 @@ def _neuromorphic_card():
         st.markdown("</div>", unsafe_allow_html=True)
 
 
-@st.cache_data(show_spinner=False)
+@st.cache_data(ttl=3600, show_spinner=False)
 def _get_demo_options() -> Dict[str, Path]:
     options: Dict[str, Path] = {}
-    for file in MEDIA_DIR.glob("*.mp4"):
-        options[file.stem.replace("_", " ").title()] = file
+    try:
+        with os.scandir(MEDIA_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".mp4") and entry.is_file():
+                    options[entry.name[:-4].replace("_", " ").title()] = Path(entry.path)
+    except FileNotFoundError:
+        pass
     return options
 
 
+@st.cache_data(max_entries=128, show_spinner=False)
+def _cached_metadata(path: str, mtime: float) -> Dict[str, object]:
+    return get_video_metadata(path)
+
+
+def _load_metadata(path: str | Path) -> Dict[str, object]:
+    return _cached_metadata(str(path), Path(path).stat().st_mtime)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _read_clip_bytes(path: str, mtime: float) -> bytes:
+    # cache_resource hands back the same object on every rerun instead of a copy.
+    return Path(path).read_bytes()
+
+
 def _set_theme(mode: str) -> None:
     st.markdown(
         f"""
@@ -185,7 +205,7 @@ def _reset_generated_clip() -> None:
 
 
 def _update_source(path: Path, label: str) -> None:
-    metadata = get_video_metadata(path)
+    metadata = _load_metadata(path)
     st.session_state["source_path"] = str(path)
     st.session_state["source_title"] = label
     st.session_state["source_metadata"] = metadata
@@ -202,6 +222,58 @@ def _update_source(path: Path, label: str) -> None:
     _reset_generated_clip()
 
 
+@st.fragment
+def _render_controls(source_path: str, metadata: Dict[str, object], output_dir: Path) -> None:
+    with _neuromorphic_card():
+        st.markdown("<div class='vc-section-title'>Clip settings</div>", unsafe_allow_html=True)
+        duration = metadata.get("duration", 0.0) or 0.0
+        if duration <= 0.1:
+            st.error("Could not read video duration. Try another file.")
+            st.stop()
+
+        default_end = min(duration, 30.0)
+        if "clip_range" not in st.session_state or st.session_state["clip_range"][1] > duration:
+            st.session_state["clip_range"] = (0.0, default_end)
+
+        clip_range: Tuple[float, float] = st.slider(
+            "Select clip range",
+            min_value=0.0,
+            max_value=float(duration),
+            value=st.session_state["clip_range"],
+            step=0.1,
+            format="%.1f s",
+        )
+        st.session_state["clip_range"] = clip_range
+
+        quality = st.select_slider(
+            "Export preset",
+            options=["fast", "medium", "slow"],
+            value=st.session_state.get("quality", "medium"),
+        )
+        st.session_state["quality"] = quality
+
+        if st.button("Generate vertical short", use_container_width=True):
+            with st.spinner("Processing clip…"):
+                try:
+                    clip_path = export_vertical_clip(
+                        source_path,
+                        clip_range[0],
+                        clip_range[1],
+                        output_dir,
+                        preset=quality,
+                    )
+                except ProcessingError as exc:
+                    st.error(f"Processing failed: {exc}")
+                else:
+                    st.session_state["generated_clip"] = str(clip_path)
+                    st.session_state["export_succeeded"] = True
+                    # The exported short renders outside this fragment, so refresh the full page.
+                    _rerun()
+
+        if st.session_state.pop("export_succeeded", False):
+            st.success("Export complete. Preview below.")
+
+
 st.set_page_config(page_title="Video Clipper", layout="wide", page_icon="🎬")
 _inject_theme_css()
 
@@ -220,8 +292,11 @@ with st.sidebar:
     demo_options = _get_demo_options()
     if demo_options:
         demo_choice = st.selectbox("Demo video", ["None"] + list(demo_options.keys()), index=0)
-        if demo_choice != "None":
-            _update_source(demo_options[demo_choice], demo_choice)
+        # Only (re)load on a new selection; reloading every rerun would wipe the exported clip.
+        if demo_choice != st.session_state.get("loaded_demo_choice"):
+            st.session_state["loaded_demo_choice"] = demo_choice
+            if demo_choice != "None":
+                _update_source(demo_options[demo_choice], demo_choice)
 
     current_source = st.session_state.get("source_path")
     if current_source:
@@ -246,9 +321,10 @@ upload_col, url_col = st.columns(2)
 with upload_col:
     st.markdown("<div class='vc-section-title'>Upload video</div>", unsafe_allow_html=True)
     uploaded = st.file_uploader("", type=("mp4", "mov", "mkv", "avi"), label_visibility="collapsed")
-    if uploaded:
+    if uploaded and uploaded.file_id != st.session_state.get("loaded_upload_id"):
         path = _persist_upload(uploaded)
         if path:
+            st.session_state["loaded_upload_id"] = uploaded.file_id
             _update_source(path, "Local upload")
             st.success("Upload saved. Preview ready below.")
 
@@ -277,10 +353,7 @@ with url_col:
         else:
             progress_placeholder.empty()
             if result.path.exists():
-                destination = CACHE_DIR / result.path.name
-                if result.path.resolve() != destination.resolve():
-                    shutil.move(str(result.path), destination)
-                _update_source(destination, result.title)
+                _update_source(result.path, result.title)
                 status_placeholder.success("Video ready for clipping.")
             else:
                 status_placeholder.error("The downloaded file was not found.")
@@ -292,7 +365,7 @@ if not source_path:
     st.info("Upload a video or provide a YouTube URL to start.")
     st.stop()
 
-metadata = st.session_state.get("source_metadata") or get_video_metadata(source_path)
+metadata = st.session_state.get("source_metadata") or _load_metadata(source_path)
 st.session_state["source_metadata"] = metadata
 
 preview_col, controls_col = st.columns([3, 2])
@@ -304,49 +377,7 @@ with preview_col:
         st.caption("Original aspect ratio. Export will adapt to 9:16 vertical format.")
 
 with controls_col:
-    with _neuromorphic_card():
-        st.markdown("<div class='vc-section-title'>Clip settings</div>", unsafe_allow_html=True)
-        duration = metadata.get("duration", 0.0) or 0.0
-        if duration <= 0.1:
-            st.error("Could not read video duration. Try another file.")
-            st.stop()
-
-        default_end = min(duration, 30.0)
-        if "clip_range" not in st.session_state or st.session_state["clip_range"][1] > duration:
-            st.session_state["clip_range"] = (0.0, default_end)
-
-        clip_range: Tuple[float, float] = st.slider(
-            "Select clip range",
-            min_value=0.0,
-            max_value=float(duration),
-            value=st.session_state["clip_range"],
-            step=0.1,
-            format="%.1f s",
-        )
-        st.session_state["clip_range"] = clip_range
-
-        quality = st.select_slider(
-            "Export preset",
-            options=["fast", "medium", "slow"],
-            value=st.session_state.get("quality", "medium"),
-        )
-        st.session_state["quality"] = quality
-
-        if st.button("Generate vertical short", use_container_width=True):
-            with st.spinner("Processing clip…"):
-                try:
-                    clip_path = export_vertical_clip(
-                        source_path,
-                        clip_range[0],
-                        clip_range[1],
-                        OUTPUT_DIR,
-                        preset=quality,
-                    )
-                except ProcessingError as exc:
-                    st.error(f"Processing failed: {exc}")
-                else:
-                    st.session_state["generated_clip"] = str(clip_path)
-                    st.success("Export complete. Preview below.")
+    _render_controls(source_path, metadata, OUTPUT_DIR)
 
 generated_clip = st.session_state.get("generated_clip")
 if generated_clip:
@@ -355,11 +386,10 @@ if generated_clip:
         st.markdown("<div class='vc-section-title'>Exported short</div>", unsafe_allow_html=True)
         st.video(generated_clip)
         clip_path = Path(generated_clip)
-        with open(clip_path, "rb") as file:
-            st.download_button(
-                label="Download MP4",
-                data=file.read(),
-                file_name=clip_path.name,
-                mime="video/mp4",
-            )
+        st.download_button(
+            label="Download MP4",
+            data=_read_clip_bytes(str(clip_path), clip_path.stat().st_mtime),
+            file_name=clip_path.name,
+            mime="video/mp4",
+        )
         st.caption(f"Saved to {clip_path.relative_to(APP_ROOT)}")
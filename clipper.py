@@ -2,16 +2,15 @@
 from __future__ import annotations
 
 import contextlib
-import math
+import functools
+import json
 import os
-import tempfile
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Tuple
-
-import yt_dlp
-from moviepy.editor import VideoFileClip
-from moviepy.video.fx.all import crop as vfx_crop
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 
 class ClipperError(Exception):
@@ -61,6 +60,7 @@ def download_video(
     url: str,
     output_dir: str | Path,
     progress_callback: Optional[ProgressCallback] = None,
+    max_height: int = 1920,
 ) -> DownloadResult:
     """Download a YouTube video as MP4 using yt-dlp.
 
@@ -72,8 +72,13 @@ def download_video(
         Directory where the resulting file should be stored.
     progress_callback:
         Optional callable receiving (progress, yt_dlp_dict) where progress is 0-1.
+    max_height:
+        Preferred tallest video stream; anything larger would be downscaled on export anyway.
+        Falls back to the best available format when nothing fits the cap.
     """
 
+    import yt_dlp  # deferred: importing yt-dlp is slow and only downloads need it
+
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -89,7 +94,12 @@ def download_video(
             progress_callback(1.0, status)
 
     ydl_opts = {
-        "format": "bestvideo*+bestaudio/best",
+        "format": (
+            f"bestvideo[height<={max_height}][ext=mp4]+bestaudio[ext=m4a]"
+            f"/bestvideo[height<={max_height}]+bestaudio"
+            f"/best[height<={max_height}]"
+            "/bestvideo*+bestaudio/best"
+        ),
         "merge_output_format": "mp4",
         "outtmpl": str(output_dir / "%(id)s.%(ext)s"),
         "noplaylist": True,
@@ -116,25 +126,140 @@ def download_video(
     )
 
 
-def get_video_metadata(path: str | Path) -> Dict[str, Any]:
-    """Return inexpensive metadata (duration, size) for a local video file."""
+_METADATA_VERSION = 3
+
+
+def _sidecar_path(path: Path) -> Path:
+    return path.with_suffix(path.suffix + ".meta.json")
+
+
+def _parse_frame_rate(rate: Optional[str]) -> Optional[float]:
+    """Convert an ffprobe rational such as ``30000/1001`` into a float."""
 
-    path = Path(path)
-    if not path.exists():
-        raise ProcessingError(f"Video not found at {path}")
+    if not rate:
+        return None
+    numerator, _, denominator = rate.partition("/")
+    try:
+        value = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value or None
+
+
+def _stream_rotation(stream: Dict[str, Any]) -> int:
+    """Return the display rotation in degrees from side data or the legacy ``rotate`` tag."""
+
+    for side_data in stream.get("side_data_list") or []:
+        if "rotation" in side_data:
+            with contextlib.suppress(TypeError, ValueError):
+                return int(float(side_data["rotation"]))
+    with contextlib.suppress(TypeError, ValueError):
+        return int(float((stream.get("tags") or {}).get("rotate", 0)))
+    return 0
 
+
+def _run_ffprobe(path: Path) -> Dict[str, Any]:
+    """Probe ``path`` with ffprobe and return the fields the app relies on."""
+
+    # Limit the JSON to the fields parsed below; rotation lives in stream tags/side data.
+    entries = (
+        "stream=codec_type,codec_name,width,height,avg_frame_rate,r_frame_rate,duration"
+        ":stream_tags=rotate:stream_side_data=rotation:format=duration"
+    )
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        entries,
+        "-of",
+        "json",
+        str(path),
+    ]
     try:
-        with VideoFileClip(str(path)) as clip:
-            return {
-                "duration": float(clip.duration or 0.0),
-                "fps": float(clip.fps) if clip.fps else None,
-                "width": int(clip.w),
-                "height": int(clip.h),
-                "filesize": path.stat().st_size,
-            }
-    except OSError as exc:  # pragma: no cover - moviepy raises OSError for decoding issues
+        result = subprocess.run(cmd, check=True, capture_output=True)
+        probe = json.loads(result.stdout or b"{}")
+    except FileNotFoundError as exc:
+        raise ProcessingError("ffprobe executable not found on PATH.") from exc
+    except (subprocess.CalledProcessError, ValueError) as exc:
         raise ProcessingError(f"Unable to read video metadata: {exc}") from exc
 
+    streams = probe.get("streams") or []
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+    if video is None:
+        raise ProcessingError(f"No video stream found in {path.name}.")
+
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+
+    # ffmpeg autorotates on decode, so report the displayed (not coded) dimensions.
+    width, height = int(video.get("width") or 0), int(video.get("height") or 0)
+    if _stream_rotation(video) % 180 == 90:
+        width, height = height, width
+
+    duration = video.get("duration") or (probe.get("format") or {}).get("duration") or 0.0
+    return {
+        "duration": float(duration),
+        "fps": _parse_frame_rate(video.get("avg_frame_rate")) or _parse_frame_rate(video.get("r_frame_rate")),
+        "width": width,
+        "height": height,
+        "audio_codec": audio.get("codec_name") if audio else None,
+    }
+
+
+_CLIP_CACHE: Dict[Tuple[str, float], Dict[str, Any]] = {}
+_CLIP_CACHE_MAX_ENTRIES = 128
+# Streamlit runs each session's script on its own thread, so guard every cache access.
+_CLIP_CACHE_LOCK = threading.Lock()
+
+
+def _probe_metadata(path: Path, mtime: float, size: int) -> Dict[str, Any]:
+    """Return probed metadata, preferring a still-valid sidecar over ffprobe."""
+
+    sidecar = _sidecar_path(path)
+    with contextlib.suppress(OSError, ValueError):
+        with open(sidecar, "r", encoding="utf-8") as handle:
+            cached = json.load(handle)
+        if (
+            cached.get("version") == _METADATA_VERSION
+            and cached.get("mtime") == mtime
+            and cached.get("size") == size
+        ):
+            return cached["metadata"]
+
+    metadata = _run_ffprobe(path)
+    payload = {"version": _METADATA_VERSION, "mtime": mtime, "size": size, "metadata": metadata}
+    with contextlib.suppress(OSError):
+        with open(sidecar, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle)
+    return metadata
+
+
+def get_video_metadata(path: str | Path) -> Dict[str, Any]:
+    """Return inexpensive metadata (duration, size) for a local video file.
+
+    Results are cached in ``_CLIP_CACHE`` and in a ``<name>.meta.json`` sidecar
+    keyed on the file's mtime and size, so repeated lookups skip ffprobe entirely.
+    """
+
+    path = Path(path).resolve()
+    try:
+        stat = path.stat()
+    except OSError as exc:
+        raise ProcessingError(f"Video not found at {path}") from exc
+
+    key = (str(path), stat.st_mtime)
+    with _CLIP_CACHE_LOCK:
+        cached = _CLIP_CACHE.get(key)
+    if cached is None or cached["filesize"] != stat.st_size:
+        # Probe outside the lock so one slow ffprobe doesn't block other sessions.
+        cached = dict(_probe_metadata(path, stat.st_mtime, stat.st_size), filesize=stat.st_size)
+        with _CLIP_CACHE_LOCK:
+            _CLIP_CACHE[key] = cached
+            # Dicts keep insertion order, so the first keys are the oldest entries.
+            while len(_CLIP_CACHE) > _CLIP_CACHE_MAX_ENTRIES:
+                _CLIP_CACHE.pop(next(iter(_CLIP_CACHE)), None)
+    return dict(cached)
+
 
 def sanitize_timecodes(start: float, end: float, duration: float, min_length: float = 0.5) -> Tuple[float, float]:
     """Clamp and validate requested start/end timestamps."""
@@ -142,19 +267,21 @@ def sanitize_timecodes(start: float, end: float, duration: float, min_length: fl
     if duration <= 0:
         raise ProcessingError("Video duration is zero.")
 
-    start = max(0.0, float(start))
-    end = min(float(end), float(duration))
+    # Work in whole milliseconds so every comparison below is an exact integer one.
+    duration_ms = round(float(duration) * 1000)
+    start_ms = max(0, round(float(start) * 1000))
+    end_ms = min(round(float(end) * 1000), duration_ms)
 
-    if end - start < min_length:
+    if end_ms - start_ms < round(min_length * 1000):
         raise ProcessingError("Clip selection is too short. Increase the end time.")
 
-    if start >= duration:
+    if start_ms >= duration_ms:
         raise ProcessingError("Start time falls outside the video.")
 
-    if end <= start:
+    if end_ms <= start_ms:
         raise ProcessingError("End time must be greater than start time.")
 
-    return round(start, 3), round(end, 3)
+    return start_ms / 1000.0, end_ms / 1000.0
 
 
 def compute_crop_box(width: int, height: int, target_width: int, target_height: int) -> CropBox:
@@ -163,38 +290,152 @@ def compute_crop_box(width: int, height: int, target_width: int, target_height:
     if width <= 0 or height <= 0 or target_width <= 0 or target_height <= 0:
         raise ProcessingError("Invalid dimensions for crop computation.")
 
-    src_ratio = width / height
-    dest_ratio = target_width / target_height
+    # Compare aspect ratios by cross-multiplying so the math stays in integers.
+    src_cross = width * target_height
+    dest_cross = height * target_width
 
-    if math.isclose(src_ratio, dest_ratio, rel_tol=1e-03):
+    if abs(src_cross - dest_cross) * 1000 <= max(src_cross, dest_cross):
         return CropBox(0, 0, width, height)
 
-    if src_ratio > dest_ratio:
-        new_width = int(round(height * dest_ratio))
+    if src_cross > dest_cross:
+        new_width = (dest_cross + target_height // 2) // target_height
         offset_x = (width - new_width) // 2
         return CropBox(offset_x, 0, offset_x + new_width, height)
 
-    new_height = int(round(width / dest_ratio))
+    new_height = (src_cross + target_width // 2) // target_width
     offset_y = (height - new_height) // 2
     return CropBox(0, offset_y, width, offset_y + new_height)
 
 
-def _apply_vertical_transform(clip: VideoFileClip, resolution: Tuple[int, int]) -> VideoFileClip:
-    """Crop and resize the clip to the target vertical resolution."""
+def _build_video_filter(crop_box: CropBox, resolution: Tuple[int, int]) -> str:
+    """Return the fused crop+scale filter graph so ffmpeg does all spatial work in one pass."""
 
     target_width, target_height = resolution
-    crop_box = compute_crop_box(clip.w, clip.h, target_width, target_height)
-
-    if crop_box.width != clip.w or crop_box.height != clip.h:
-        clip = clip.fx(
-            vfx_crop,
-            x1=crop_box.x1,
-            y1=crop_box.y1,
-            x2=crop_box.x2,
-            y2=crop_box.y2,
+    scale = f"scale={target_width}:{target_height}:flags=lanczos"
+    return f"crop={crop_box.width}:{crop_box.height}:{crop_box.x1}:{crop_box.y1},{scale}"
+
+
+_HW_ENCODER_ARGS: Dict[str, List[str]] = {
+    "h264_nvenc": ["-preset", "p4", "-b:v", "6M"],
+    "h264_videotoolbox": ["-b:v", "6M"],
+    "h264_qsv": ["-preset", "medium", "-b:v", "6M"],
+}
+
+
+def _hw_encoder_works(encoder: str) -> bool:
+    """Encode a single blank frame to confirm the encoder has usable hardware behind it."""
+
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        "nullsrc=s=256x256",
+        "-frames:v",
+        "1",
+        "-c:v",
+        encoder,
+        "-f",
+        "null",
+        "-",
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_hw_encoder() -> Optional[str]:
+    """Return the first hardware H.264 encoder that can actually encode on this machine.
+
+    Builds routinely ship encoders (notably ``h264_nvenc``) without the matching
+    hardware, so each compiled-in candidate is confirmed with a one-frame test encode.
+    """
+
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"], check=True, capture_output=True
         )
+    except (OSError, subprocess.CalledProcessError):
+        return None
 
-    return clip.resize(newsize=resolution)
+    listing = result.stdout.decode(errors="replace")
+    for encoder in _HW_ENCODER_ARGS:
+        if f" {encoder} " in listing and _hw_encoder_works(encoder):
+            return encoder
+    return None
+
+
+def _build_ffmpeg_cmd(
+    source: str | Path,
+    start: float,
+    end: float,
+    crop_box: CropBox,
+    resolution: Tuple[int, int],
+    preset: str,
+    audio_bitrate: str,
+    out: str | Path,
+    encoder: str = "libx264",
+    threads: Optional[int] = None,
+    copy_audio: bool = False,
+) -> List[str]:
+    """Assemble a single-pass ffmpeg invocation that trims, crops, and scales."""
+
+    # Input-side -ss seeks the demuxer to the nearest keyframe instead of decoding from zero;
+    # ffmpeg then discards frames up to ``start`` and timestamps restart at 0, so the
+    # output-side -t makes the cut frame-accurate without a second seek.
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-fflags",
+        "+genpts",
+        "-ss",
+        f"{start:.3f}",
+        "-i",
+        str(source),
+        "-t",
+        f"{end - start:.3f}",
+        # Map the first video/audio streams explicitly: those are the ones _run_ffprobe inspects,
+        # whereas ffmpeg's default picks the audio track with the most channels.
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-map_metadata",
+        "-1",
+        "-vf",
+        _build_video_filter(crop_box, resolution),
+        "-c:v",
+        encoder,
+    ]
+    if encoder in _HW_ENCODER_ARGS:
+        cmd += _HW_ENCODER_ARGS[encoder]
+    else:
+        cmd += ["-preset", preset]
+        if preset in ("fast", "medium"):
+            cmd += ["-tune", "fastdecode"]
+    cmd += [
+        "-pix_fmt",
+        "yuv420p",
+        "-threads",
+        str(threads or min(4, os.cpu_count() or 1)),
+    ]
+    # AAC sources are already in the target codec, so copying skips a decode/encode round trip.
+    cmd += ["-c:a", "copy"] if copy_audio else ["-c:a", "aac", "-b:a", audio_bitrate]
+    cmd += [
+        "-movflags",
+        "+faststart",
+        str(out),
+    ]
+    return cmd
 
 
 def export_vertical_clip(
@@ -205,6 +446,7 @@ def export_vertical_clip(
     resolution: Tuple[int, int] = (1080, 1920),
     preset: str = "medium",
     audio_bitrate: str = "128k",
+    threads: Optional[int] = None,
 ) -> Path:
     """Trim, crop, and export a vertical clip suitable for shorts."""
 
@@ -213,43 +455,91 @@ def export_vertical_clip(
 
     metadata = get_video_metadata(source)
     trimmed_start, trimmed_end = sanitize_timecodes(start, end, metadata["duration"])
+    crop_box = compute_crop_box(metadata["width"], metadata["height"], *resolution)
+
+    # Millisecond precision keeps distinct ranges (e.g. in a batch) from sharing a file.
+    start_ms, end_ms = round(trimmed_start * 1000), round(trimmed_end * 1000)
+    filename = f"short_{Path(source).stem}_{start_ms}ms_{end_ms}ms.mp4"
+    output_path = output_dir / filename
+
+    encoders = ["libx264"]
+    hw_encoder = _detect_hw_encoder() if preset != "slow" else None
+    if hw_encoder:
+        # A probed encoder can still fail mid-export (e.g. session limits), so keep libx264 as fallback.
+        encoders.insert(0, hw_encoder)
+
+    for encoder in encoders:
+        cmd = _build_ffmpeg_cmd(
+            source,
+            trimmed_start,
+            trimmed_end,
+            crop_box,
+            resolution,
+            preset,
+            audio_bitrate,
+            output_path,
+            encoder=encoder,
+            threads=threads,
+            copy_audio=metadata.get("audio_codec") == "aac",
+        )
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+        except FileNotFoundError as exc:
+            raise ProcessingError("ffmpeg executable not found on PATH.") from exc
+        except subprocess.CalledProcessError as exc:
+            with contextlib.suppress(FileNotFoundError):
+                output_path.unlink()
+            if encoder != encoders[-1]:
+                continue
+            stderr = exc.stderr.decode(errors="replace").strip() if exc.stderr else ""
+            raise ProcessingError(f"Unable to export clip: {stderr or exc}") from exc
+        break
+
+    return output_path
 
-    with VideoFileClip(str(source)) as clip:
-        subclip = clip.subclip(trimmed_start, trimmed_end)
-        processed = _apply_vertical_transform(subclip, resolution)
 
-        fps = processed.fps or clip.fps or 30
-        filename = f"short_{Path(source).stem}_{int(trimmed_start)}_{int(trimmed_end)}.mp4"
-        output_path = output_dir / filename
+def export_vertical_clips_batch(
+    source: str | Path,
+    ranges: Sequence[Tuple[float, float]],
+    output_dir: str | Path,
+    resolution: Tuple[int, int] = (1080, 1920),
+    preset: str = "medium",
+    audio_bitrate: str = "128k",
+) -> List[Path]:
+    """Export several clips from one source in parallel, preserving the order of ``ranges``.
 
-        temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".m4a")
-        temp_audio.close()
+    Ranges that resolve to the same trimmed window are exported once and share a path,
+    so two ffmpeg processes never write the same output file.
+    """
 
-        try:
-            processed.write_videofile(
-                str(output_path),
-                codec="libx264",
-                audio_codec="aac",
-                audio_bitrate=audio_bitrate,
-                fps=fps,
-                preset=preset,
-                threads=min(4, os.cpu_count() or 1),
-                temp_audiofile=temp_audio.name,
-                remove_temp=True,
-                verbose=False,
-                logger=None,
+    if not ranges:
+        return []
+
+    # Probe once up front so every worker finds a warm sidecar instead of re-running ffprobe.
+    duration = get_video_metadata(source)["duration"]
+    windows = [sanitize_timecodes(start, end, duration) for start, end in ranges]
+    unique_windows = list(dict.fromkeys(windows))
+
+    cpu_count = os.cpu_count() or 2
+    max_workers = max(1, min(len(unique_windows), cpu_count // 2))
+    threads = max(1, cpu_count // max_workers)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            window: pool.submit(
+                export_vertical_clip,
+                source,
+                window[0],
+                window[1],
+                output_dir,
+                resolution,
+                preset,
+                audio_bitrate,
+                threads,
             )
-        except Exception as exc:  # pragma: no cover - moviepy internal errors bubble up
-            raise ProcessingError(f"Unable to export clip: {exc}") from exc
-        finally:
-            with contextlib.suppress(Exception):
-                processed.close()
-            with contextlib.suppress(Exception):
-                subclip.close()
-            with contextlib.suppress(FileNotFoundError):
-                Path(temp_audio.name).unlink()
-
-    return output_path
+            for window in unique_windows
+        }
+        return [futures[window].result() for window in windows]
 
 
 __all__ = [
@@ -263,4 +553,5 @@ __all__ = [
     "sanitize_timecodes",
     "compute_crop_box",
     "export_vertical_clip",
+    "export_vertical_clips_batch",
 ]
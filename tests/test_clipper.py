@@ -1,8 +1,26 @@
 """Unit tests for pure helpers in clipper.py."""
 
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import pytest
 
-from clipper import ProcessingError, compute_crop_box, sanitize_timecodes
+import clipper
+from clipper import (
+    _METADATA_VERSION,
+    CropBox,
+    ProcessingError,
+    _build_ffmpeg_cmd,
+    _parse_frame_rate,
+    _run_ffprobe,
+    compute_crop_box,
+    export_vertical_clip,
+    export_vertical_clips_batch,
+    get_video_metadata,
+    sanitize_timecodes,
+)
 
 
 def test_sanitize_timecodes_clamps_boundaries() -> None:
@@ -11,6 +29,12 @@ def test_sanitize_timecodes_clamps_boundaries() -> None:
     assert end == 100.0
 
 
+def test_sanitize_timecodes_rounds_to_milliseconds() -> None:
+    start, end = sanitize_timecodes(1.0004, 2.0006, duration=10.0)
+    assert start == 1.0
+    assert end == 2.001
+
+
 def test_sanitize_timecodes_rejects_invalid_windows() -> None:
     with pytest.raises(ProcessingError):
         sanitize_timecodes(10.0, 10.1, duration=10.0)
@@ -30,3 +54,189 @@ def test_compute_crop_box_returns_full_frame_when_already_matching() -> None:
     assert crop_box.y1 == 0
     assert crop_box.width == 1080
     assert crop_box.height == 1920
+
+
+def test_compute_crop_box_center_crop_tall_to_vertical() -> None:
+    crop_box = compute_crop_box(1080, 2400, 1080, 1920)
+    assert crop_box.width == 1080
+    assert crop_box.height == 1920
+    assert crop_box.x1 == 0
+    assert crop_box.y1 == 240
+
+
+def test_build_ffmpeg_cmd_seeks_before_input_and_fuses_filters() -> None:
+    cmd = _build_ffmpeg_cmd(
+        "in.mp4", 12.5, 20.0, CropBox(656, 0, 1264, 1080), (1080, 1920), "fast", "128k", "out.mp4"
+    )
+    assert cmd.index("-ss") < cmd.index("-i")
+    assert cmd[cmd.index("-ss") + 1] == "12.500"
+    assert cmd.index("-t") > cmd.index("-i")
+    assert cmd[cmd.index("-t") + 1] == "7.500"
+    assert cmd[cmd.index("-map_metadata") + 1] == "-1"
+    assert cmd[cmd.index("-vf") + 1] == "crop=608:1080:656:0,scale=1080:1920:flags=lanczos"
+    assert cmd[-1] == "out.mp4"
+
+
+def test_build_ffmpeg_cmd_moves_moov_atom_and_tunes_fast_presets() -> None:
+    crop_box = CropBox(0, 0, 1080, 1920)
+    fast = _build_ffmpeg_cmd("in.mp4", 0.0, 5.0, crop_box, (1080, 1920), "fast", "128k", "out.mp4")
+    slow = _build_ffmpeg_cmd("in.mp4", 0.0, 5.0, crop_box, (1080, 1920), "slow", "128k", "out.mp4")
+    assert fast[fast.index("-movflags") + 1] == "+faststart"
+    assert fast[fast.index("-tune") + 1] == "fastdecode"
+    assert "-movflags" in slow
+    assert "-tune" not in slow
+
+
+def test_parse_frame_rate_handles_rationals() -> None:
+    assert _parse_frame_rate("30000/1001") == pytest.approx(29.97, rel=1e-3)
+    assert _parse_frame_rate("25") == 25.0
+    assert _parse_frame_rate("0/0") is None
+
+
+@pytest.mark.parametrize(
+    "stream_extras",
+    [
+        {"side_data_list": [{"side_data_type": "Display Matrix", "rotation": -90}]},
+        {"tags": {"rotate": "270"}},
+    ],
+)
+def test_run_ffprobe_swaps_dimensions_for_rotated_video(monkeypatch, stream_extras) -> None:
+    probe = {
+        "streams": [
+            {"codec_type": "video", "width": 1920, "height": 1080, "avg_frame_rate": "30/1", **stream_extras},
+            {"codec_type": "audio", "codec_name": "aac"},
+        ],
+        "format": {"duration": "8.0"},
+    }
+
+    def fake_run(cmd, **kwargs):
+        return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(probe).encode(), stderr=b"")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    metadata = _run_ffprobe(Path("portrait.mp4"))
+    assert (metadata["width"], metadata["height"]) == (1080, 1920)
+    assert metadata["duration"] == 8.0
+    assert metadata["audio_codec"] == "aac"
+
+
+def test_get_video_metadata_reads_valid_sidecar(tmp_path) -> None:
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"not really a video")
+    stat = video.stat()
+    cached = {"duration": 12.0, "fps": 30.0, "width": 1920, "height": 1080}
+    sidecar = tmp_path / "clip.mp4.meta.json"
+    sidecar.write_text(
+        json.dumps({"version": _METADATA_VERSION, "mtime": stat.st_mtime, "size": stat.st_size, "metadata": cached})
+    )
+
+    metadata = get_video_metadata(video)
+    assert metadata["width"] == 1920
+    assert metadata["duration"] == 12.0
+    assert metadata["filesize"] == stat.st_size
+
+
+def test_build_ffmpeg_cmd_uses_bitrate_args_for_hardware_encoders() -> None:
+    crop_box = CropBox(0, 0, 1080, 1920)
+    cmd = _build_ffmpeg_cmd(
+        "in.mp4", 0.0, 5.0, crop_box, (1080, 1920), "fast", "128k", "out.mp4", encoder="h264_nvenc"
+    )
+    assert cmd[cmd.index("-c:v") + 1] == "h264_nvenc"
+    assert cmd[cmd.index("-b:v") + 1] == "6M"
+    assert "-tune" not in cmd
+
+
+def test_build_ffmpeg_cmd_copies_the_probed_aac_audio_stream() -> None:
+    crop_box = CropBox(0, 0, 1080, 1920)
+    copied = _build_ffmpeg_cmd(
+        "in.mp4", 0.0, 5.0, crop_box, (1080, 1920), "fast", "128k", "out.mp4", copy_audio=True
+    )
+    encoded = _build_ffmpeg_cmd("in.mp4", 0.0, 5.0, crop_box, (1080, 1920), "fast", "128k", "out.mp4")
+    maps = [copied[index + 1] for index, arg in enumerate(copied) if arg == "-map"]
+    assert maps == ["0:v:0", "0:a:0?"]
+    assert copied[copied.index("-c:a") + 1] == "copy"
+    assert "-b:a" not in copied
+    assert encoded[encoded.index("-c:a") + 1] == "aac"
+    assert encoded[encoded.index("-b:a") + 1] == "128k"
+
+
+def test_get_video_metadata_bounds_in_process_cache(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(clipper, "_CLIP_CACHE", {})
+    monkeypatch.setattr(clipper, "_CLIP_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(
+        clipper, "_probe_metadata", lambda path, mtime, size: {"duration": 1.0, "width": 16, "height": 9}
+    )
+
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        video = tmp_path / name
+        video.write_bytes(b"x")
+        get_video_metadata(video)
+
+    assert [Path(path).name for path, _ in clipper._CLIP_CACHE] == ["b.mp4", "c.mp4"]
+
+
+def test_export_vertical_clip_retries_with_libx264_after_hardware_failure(tmp_path, monkeypatch) -> None:
+    metadata = {"duration": 60.0, "width": 1920, "height": 1080, "audio_codec": "aac"}
+    monkeypatch.setattr(clipper, "get_video_metadata", lambda source: dict(metadata))
+    monkeypatch.setattr(clipper, "_detect_hw_encoder", lambda: "h264_nvenc")
+    encoders = []
+
+    def fake_run(cmd, **kwargs):
+        encoder = cmd[cmd.index("-c:v") + 1]
+        encoders.append(encoder)
+        output = Path(cmd[-1])
+        if encoder == "h264_nvenc":
+            output.write_bytes(b"partial")
+            raise subprocess.CalledProcessError(1, cmd, stderr=b"No NVENC capable devices found")
+        assert not output.exists(), "partial hardware output should be removed before retrying"
+        output.write_bytes(b"ok")
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    output = export_vertical_clip("source.mp4", 1.0, 6.0, tmp_path, preset="fast")
+
+    assert encoders == ["h264_nvenc", "libx264"]
+    assert output.read_bytes() == b"ok"
+
+
+def test_detect_hw_encoder_skips_compiled_encoders_without_hardware(monkeypatch) -> None:
+    listing = b" V....D h264_nvenc  NVIDIA NVENC\n V....D h264_qsv  Intel QSV\n"
+
+    def fake_run(cmd, **kwargs):
+        if "-encoders" in cmd:
+            return subprocess.CompletedProcess(cmd, 0, stdout=listing, stderr=b"")
+        if "h264_nvenc" in cmd:
+            raise subprocess.CalledProcessError(1, cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    clipper._detect_hw_encoder.cache_clear()
+    try:
+        assert clipper._detect_hw_encoder() == "h264_qsv"
+    finally:
+        clipper._detect_hw_encoder.cache_clear()
+
+
+def test_export_vertical_clips_batch_keeps_order_and_unique_paths(tmp_path, monkeypatch) -> None:
+    metadata = {"duration": 60.0, "width": 1920, "height": 1080, "audio_codec": "aac"}
+    monkeypatch.setattr(clipper, "get_video_metadata", lambda source: dict(metadata))
+    monkeypatch.setattr(clipper, "_detect_hw_encoder", lambda: None)
+    # Threads share the monkeypatched module state; worker processes would not.
+    monkeypatch.setattr(clipper, "ProcessPoolExecutor", ThreadPoolExecutor)
+    written = []
+
+    def fake_run(cmd, **kwargs):
+        written.append(cmd[-1])
+        Path(cmd[-1]).write_bytes(b"ok")
+        return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=b"")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    ranges = [(1.2, 5.3), (1.7, 5.9), (10.0, 20.0), (1.2, 5.3)]
+    paths = export_vertical_clips_batch("source.mp4", ranges, tmp_path, preset="fast")
+
+    assert [path.name for path in paths] == [
+        "short_source_1200ms_5300ms.mp4",
+        "short_source_1700ms_5900ms.mp4",
+        "short_source_10000ms_20000ms.mp4",
+        "short_source_1200ms_5300ms.mp4",
+    ]
+    assert len(written) == len(set(written)) == 3